@@ -0,0 +1,306 @@
+# Opt-in profiling for dashboard reruns.
+#
+# Turn it on with a query param:
+#   ?profile=1                      wall-clock timers only
+#   ?profile=cprofile,tracemalloc   timers + cProfile and/or allocation tracking
+#   ?profile=all                    everything
+#   ?profile=off                    disable, even if enabled in secrets
+#
+# or from .streamlit/secrets.toml:
+#   [profiling]
+#   enabled = true
+#   cprofile = true
+#   tracemalloc = true
+#   dump_dir = "profiles"   # write <stamp>.prof and <stamp>.json per rerun
+#   top_n = 15
+#
+# The report is rendered in a sidebar panel at the end of each rerun.
+#
+# tracemalloc and cProfile are process-wide, and every session shares the
+# process. tracemalloc runs while at least one session uses it, so its figures
+# cover all sessions. Only one session runs cProfile at a time; the others skip
+# it and say so in the panel.
+import cProfile
+import datetime
+import json
+import marshal
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+import streamlit as st
+
+TOP_N = 15
+
+# Frames from the profiler machinery itself are left out of allocation reports.
+# They are dropped from the grouped per-line diff, which is far cheaper than
+# Snapshot.filter_traces() over every live trace in the process.
+_EXCLUDED_FILES = {
+    tracemalloc.__file__,
+    "<frozen importlib._bootstrap>",
+    "<frozen importlib._bootstrap_external>",
+}
+
+# --- Process-wide profilers, shared by every session ---
+_lock = threading.Lock()
+_tracemalloc_users = 0
+_tracemalloc_started = False  # False if someone else was already tracing
+_cprofile_owner = None
+
+def _acquire_tracemalloc():
+    global _tracemalloc_users, _tracemalloc_started
+    with _lock:
+        if _tracemalloc_users == 0:
+            _tracemalloc_started = not tracemalloc.is_tracing()
+            if _tracemalloc_started:
+                tracemalloc.start()
+        _tracemalloc_users += 1
+
+def _release_tracemalloc():
+    global _tracemalloc_users
+    with _lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and _tracemalloc_started:
+            tracemalloc.stop()
+
+def _acquire_cprofile(profiler):
+    # Python 3.12+ allows one active cProfile per process
+    global _cprofile_owner
+    with _lock:
+        if _cprofile_owner is not None:
+            return False
+        _cprofile_owner = profiler
+        return True
+
+def _release_cprofile(profiler):
+    global _cprofile_owner
+    with _lock:
+        if _cprofile_owner is profiler:
+            _cprofile_owner = None
+
+class RerunProfiler:
+    def __init__(self, enabled=False, use_cprofile=False, use_tracemalloc=False, dump_dir=None, top_n=TOP_N):
+        self.enabled = enabled
+        self.use_cprofile = enabled and use_cprofile
+        self.use_tracemalloc = enabled and use_tracemalloc
+        self.dump_dir = dump_dir
+        self.top_n = top_n
+
+        self.timings = []  # (label, seconds), in the order blocks finished
+        self.total = None
+        self.stats = None
+        self.allocations = None
+        self.memory_growth = None
+        self.peak_memory = None
+        self.notices = []
+        self.finished = False
+
+        self._started = None
+        self._section = None
+        self._profile = None
+        self._tracing = False
+        self._memory_baseline = None
+        self._start_snapshot = None
+
+    def start(self):
+        if not self.enabled:
+            return self
+        if self.use_tracemalloc:
+            # No reset_peak(): that would wipe other sessions' figures.
+            # Compare against a baseline taken now instead.
+            _acquire_tracemalloc()
+            self._tracing = True
+            self._memory_baseline = tracemalloc.get_traced_memory()[0]
+            self._start_snapshot = tracemalloc.take_snapshot()
+        if self.use_cprofile:
+            if _acquire_cprofile(self):
+                self._profile = cProfile.Profile()
+                try:
+                    self._profile.enable()
+                except ValueError:  # another profiler is already active
+                    self._profile = None
+                    _release_cprofile(self)
+            if self._profile is None:
+                self.notices.append("cProfile skipped: another profiler is running in this process.")
+        self._started = time.perf_counter()
+        return self
+
+    @contextmanager
+    def block(self, label):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings.append((label, time.perf_counter() - start))
+
+    def section(self, label):
+        # Times everything from here until the next section() or finish()
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self._close_section(now)
+        self._section = (label, now)
+
+    def _close_section(self, now):
+        if self._section is not None:
+            label, start = self._section
+            self.timings.append((label, now - start))
+            self._section = None
+
+    def abort(self):
+        # Release cProfile/tracemalloc for a rerun that never reached finish();
+        # call it when the rerun ends, e.g. from a finally block
+        if not self.enabled or self.finished:
+            return
+        self.finished = True
+        self._release()
+
+    def _release(self):
+        if self._profile is not None:
+            self._profile.disable()
+            _release_cprofile(self)
+        if self._tracing:
+            self._tracing = False
+            _release_tracemalloc()
+
+    def finish(self):
+        if not self.enabled or self.finished:
+            return
+        self.finished = True
+        end = time.perf_counter()
+        self._close_section(end)
+        self.total = end - self._started
+
+        # Stop cProfile before the tracemalloc work so it does not profile itself
+        if self._profile is not None:
+            self._profile.disable()
+            self.stats = pstats.Stats(self._profile)
+        if self._tracing:
+            current, self.peak_memory = tracemalloc.get_traced_memory()
+            self.memory_growth = current - self._memory_baseline
+            snapshot = tracemalloc.take_snapshot()
+            self.allocations = [
+                stat for stat in snapshot.compare_to(self._start_snapshot, "lineno")
+                if stat.traceback[0].filename not in _EXCLUDED_FILES
+            ]
+            self._start_snapshot = None
+        self._release()
+
+        if self.dump_dir:
+            self.dump(self.dump_dir)
+        render_sidebar(self)
+
+    # --- Reports ---
+    def timings_df(self):
+        return pd.DataFrame(
+            [(label, seconds * 1000) for label, seconds in self.timings],
+            columns=["block", "ms"],
+        )
+
+    def hotspots_df(self):
+        rows = [
+            {
+                "function": f"{os.path.basename(filename)}:{line}({func})",
+                "calls": calls,
+                "own_ms": own * 1000,
+                "cumulative_ms": cumulative * 1000,
+            }
+            for (filename, line, func), (_, calls, own, cumulative, _) in self.stats.stats.items()
+        ]
+        df = pd.DataFrame(rows, columns=["function", "calls", "own_ms", "cumulative_ms"])
+        return df.sort_values("cumulative_ms", ascending=False).head(self.top_n).reset_index(drop=True)
+
+    def allocations_df(self):
+        # Net allocations between the start and the end of the rerun
+        grown = sorted(self.allocations, key=lambda stat: stat.size_diff, reverse=True)
+        rows = []
+        for stat in grown[: self.top_n]:
+            frame = stat.traceback[0]
+            rows.append({
+                "site": f"{os.path.basename(frame.filename)}:{frame.lineno}",
+                "size_kib": stat.size_diff / 1024,
+                "blocks": stat.count_diff,
+            })
+        return pd.DataFrame(rows, columns=["site", "size_kib", "blocks"])
+
+    def profile_bytes(self):
+        # Same format as pstats.Stats.dump_stats, loadable with pstats/snakeviz
+        return marshal.dumps(self.stats.stats)
+
+    def dump(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        if self.stats is not None:
+            self.stats.dump_stats(os.path.join(directory, f"{stamp}.prof"))
+        report = {
+            "total_ms": self.total * 1000,
+            "blocks": [{"block": label, "ms": seconds * 1000} for label, seconds in self.timings],
+            "memory_growth_bytes": self.memory_growth,
+            "process_peak_memory_bytes": self.peak_memory,
+        }
+        with open(os.path.join(directory, f"{stamp}.json"), "w") as f:
+            json.dump(report, f, indent=2)
+
+# --- Streamlit glue ---
+def start_rerun():
+    cfg = st.secrets.get("profiling", {})
+    enabled = bool(cfg.get("enabled", False))
+    use_cprofile = bool(cfg.get("cprofile", False))
+    use_tracemalloc = bool(cfg.get("tracemalloc", False))
+
+    param = st.query_params.get("profile")
+    if param is not None:
+        opts = {opt.strip().lower() for opt in param.split(",")}
+        if opts & {"0", "off", "false", "no"}:
+            enabled = False
+        else:
+            enabled = True
+            use_cprofile = use_cprofile or bool(opts & {"cprofile", "all"})
+            use_tracemalloc = use_tracemalloc or bool(opts & {"tracemalloc", "all"})
+
+    # chococrunch.py aborts interrupted reruns in a finally block; this is a
+    # safety net in case the previous rerun's thread never got that far
+    previous = st.session_state.get("_profiler")
+    if previous is not None:
+        previous.abort()
+
+    profiler = RerunProfiler(
+        enabled=enabled,
+        use_cprofile=use_cprofile,
+        use_tracemalloc=use_tracemalloc,
+        dump_dir=cfg.get("dump_dir"),
+        top_n=int(cfg.get("top_n", TOP_N)),
+    )
+    st.session_state["_profiler"] = profiler
+    return profiler.start()
+
+def render_sidebar(profiler):
+    with st.sidebar.expander("⏱️ Profiling", expanded=True):
+        st.metric("Rerun time", f"{profiler.total * 1000:.0f} ms")
+        st.dataframe(profiler.timings_df(), hide_index=True)
+        for notice in profiler.notices:
+            st.caption(notice)
+
+        if profiler.stats is not None:
+            st.caption(f"Top {profiler.top_n} functions by cumulative time (cProfile)")
+            st.dataframe(profiler.hotspots_df(), hide_index=True)
+            st.download_button(
+                "Download .prof",
+                data=profiler.profile_bytes(),
+                file_name="chococrunch_rerun.prof",
+                mime="application/octet-stream",
+            )
+
+        if profiler.allocations is not None:
+            st.caption("tracemalloc covers the whole process, including other sessions' reruns.")
+            st.metric("Traced memory growth", f"{profiler.memory_growth / 2**20:+.1f} MiB")
+            st.metric("Process peak traced memory", f"{profiler.peak_memory / 2**20:.1f} MiB")
+            st.caption(f"Top {profiler.top_n} allocation sites during this rerun (tracemalloc)")
+            st.dataframe(profiler.allocations_df(), hide_index=True)
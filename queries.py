@@ -0,0 +1,309 @@
+# Named SQL queries, the shared engine and the result cache.
+# Used by both the Streamlit dashboard (chococrunch.py) and the headless
+# query API (query_api.py) so both serve the same numbers.
+import hashlib
+import threading
+import time
+
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+# -----------------------------
+# Named queries (one dict per dashboard tab)
+# -----------------------------
+PRODUCT_QUERIES = {
+    "1. Count products per brand": """
+        SELECT brand, COUNT(product_name) AS total_products
+        FROM product_info
+        WHERE brand IS NOT NULL
+        GROUP BY brand
+        ORDER BY total_products DESC;
+    """,
+    "2. Count unique products per brand": """
+        SELECT brand, COUNT(DISTINCT product_name) AS unique_products
+        FROM product_info
+        WHERE brand IS NOT NULL
+        GROUP BY brand
+        ORDER BY unique_products DESC;
+    """,
+    "3. Top 5 brands by product count": """
+        SELECT brand, COUNT(product_name) AS total_products
+        FROM product_info
+        WHERE brand IS NOT NULL
+        GROUP BY brand
+        ORDER BY total_products DESC
+        LIMIT 5;
+    """,
+    "4. Products with missing product name": """
+        SELECT brand, COUNT(*) AS missing_names
+        FROM product_info
+        WHERE product_name IS NULL
+        GROUP BY brand
+        ORDER BY missing_names DESC;
+    """,
+    "5. Number of unique brands": """
+        SELECT COUNT(DISTINCT brand) AS unique_brands
+        FROM product_info
+        WHERE brand IS NOT NULL;
+    """,
+    "6. Products with code starting with '3'": """
+        SELECT product_code, product_name
+        FROM product_info
+        WHERE product_code LIKE '3%'
+        AND product_name IS NOT NULL
+        AND TRIM(product_name) != '';
+    """
+}
+
+NUTRIENT_QUERIES = {
+    "1. Top 10 products with highest energy_kcal_value": """
+        SELECT p.product_name, n.energy_kcal_value, p.brand
+        FROM product_info p
+        JOIN nutrient_info n ON p.product_code=n.product_code
+        ORDER BY n.energy_kcal_value DESC
+        LIMIT 10;
+    """,
+
+    "2. Average sugars_value per nova_group": """
+        SELECT nova_group, AVG(sugars_value) AS avg_sugar
+        FROM nutrient_info
+        WHERE nova_group IS NOT NULL AND TRIM(nova_group) != ''
+        GROUP BY nova_group
+        ORDER BY nova_group;
+    """,
+
+    "3. Count products with fat_value > 20g": """
+        SELECT COUNT(*) AS fat_count
+        FROM nutrient_info
+        WHERE fat_value > 20
+        """,
+
+    "4. Average carbohydrates_value per product": """
+        SELECT p.product_name AS `Product Name`,
+        AVG(n.carbohydrates_value) AS `Average Carbs Value`
+        FROM product_info p
+        JOIN nutrient_info n ON n.product_code = p.product_code
+        GROUP BY p.product_name
+        ORDER BY `Average Carbs Value` DESC;
+        """,
+
+    "5. Products with sodium_value > 1g": """
+        SELECT p.product_name, n.sodium_value
+        FROM product_info p
+        JOIN nutrient_info n ON p.product_code = n.product_code
+        WHERE n.sodium_value > 1;
+    """,
+
+    "6. Count products with non-zero fruits-vegetables-nuts content": """
+        SELECT COUNT(*) AS products_with_fv_nuts
+        FROM nutrient_info
+        WHERE fruits_veg_nuts_pct > 0
+    """,
+
+    "7. Products with energy_kcal_value > 500": """
+        SELECT p.product_name, n.energy_kcal_value
+        FROM product_info p
+        JOIN nutrient_info n ON p.product_code = n.product_code
+        WHERE n.energy_kcal_value > 500
+        ORDER BY energy_kcal_value DESC;
+    """
+}
+
+DERIVED_QUERIES = {
+    "1. Count products per calorie_category": """
+        SELECT calorie_category, COUNT(*) AS product_count
+        FROM derived_metrics
+        GROUP BY calorie_category
+        ORDER BY product_count DESC;
+    """,
+    "2. Count of High Sugar products": """
+        SELECT COUNT(*) AS high_sugar_count
+        FROM derived_metrics
+        WHERE sugar_category='High Sugar';
+    """,
+    "3. Average sugar_to_carb_ratio for High Calorie products": """
+        SELECT AVG(sugar_to_carb_ratio) AS avg_ratio
+        FROM derived_metrics
+        WHERE calorie_category='High Calorie';
+    """,
+    "4. Products that are both High Calorie and High Sugar": """
+        SELECT p.product_name, p.brand, d.calorie_category, d.sugar_category
+        FROM derived_metrics d
+        JOIN product_info p ON d.product_code=p.product_code
+        WHERE d.calorie_category='High Calorie' AND d.sugar_category='High Sugar';
+    """,
+    "5. Number of products marked as ultra-processed": """
+        SELECT COUNT(*) AS ultra_processed_count
+        FROM derived_metrics
+        WHERE is_ultra_processed='Yes';
+    """,
+    "6. Products with sugar_to_carb_ratio > 0.7": """
+        SELECT p.product_name, p.brand, d.sugar_to_carb_ratio
+        FROM derived_metrics d
+        JOIN product_info p ON d.product_code=p.product_code
+        WHERE d.sugar_to_carb_ratio > 0.7
+        ORDER BY d.sugar_to_carb_ratio DESC;
+    """,
+    "7. Average sugar_to_carb_ratio per calorie_category": """
+        SELECT calorie_category, AVG(sugar_to_carb_ratio) AS avg_ratio
+        FROM derived_metrics
+        GROUP BY calorie_category;
+    """
+}
+
+JOIN_QUERIES = {
+    # 1. Top 5 brands with most High Calorie products
+    "1. Top 5 brands with most High Calorie products": """
+        SELECT p.brand, COUNT(*) AS high_calorie_count
+        FROM derived_metrics d
+        JOIN product_info p ON d.product_code = p.product_code
+        WHERE d.calorie_category='High Calorie'
+        GROUP BY p.brand
+        ORDER BY high_calorie_count DESC
+        LIMIT 5;
+    """,
+
+    # 2. Average energy_kcal_value for each calorie_category
+    "2. Average energy_kcal_value per calorie_category": """
+        SELECT d.calorie_category, AVG(n.energy_kcal_value) AS avg_energy
+        FROM derived_metrics d
+        JOIN nutrient_info n ON d.product_code = n.product_code
+        GROUP BY d.calorie_category;
+    """,
+
+    # 3. Count of ultra-processed products per brand
+    "3. Count of ultra-processed products per brand": """
+        SELECT p.brand, COUNT(*) AS ultra_count
+        FROM derived_metrics d
+        JOIN product_info p ON d.product_code = p.product_code
+        WHERE d.is_ultra_processed='Yes'
+        GROUP BY p.brand
+        ORDER BY ultra_count DESC;
+    """,
+
+    # 4. Products with High Sugar and High Calorie along with brand
+    "4. High Sugar & High Calorie products with brand": """
+        SELECT p.product_name, p.brand, n.energy_kcal_value, n.sugars_value
+        FROM derived_metrics d
+        JOIN product_info p ON d.product_code = p.product_code
+        JOIN nutrient_info n ON d.product_code = n.product_code
+        WHERE d.calorie_category='High Calorie' AND d.sugar_category='High Sugar';
+    """,
+
+    # 5. Average sugar content per brand for ultra-processed products
+    "5. Average sugar value per brand (Ultra-Processed Products)": """
+        SELECT p.brand, AVG(n.sugars_value) AS avg_sugars
+        FROM derived_metrics d
+        JOIN product_info p ON d.product_code = p.product_code
+        JOIN nutrient_info n ON d.product_code = n.product_code
+        WHERE d.is_ultra_processed='Yes'
+        GROUP BY p.brand;
+    """,
+
+    # 6. Number of products with fruits/vegetables/nuts content in each calorie_category
+    "6. Products with fruits/vegetables/nuts per calorie_category": """
+        SELECT d.calorie_category, COUNT(*) AS fv_nuts_count
+        FROM derived_metrics d
+        JOIN nutrient_info n ON d.product_code = n.product_code
+        WHERE n.fruits_veg_nuts_pct > 0
+        GROUP BY d.calorie_category;
+    """,
+
+    # 7. Top 5 products by sugar_to_carb_ratio with their calorie and sugar category
+    "7. Top 5 products by sugar_to_carb_ratio": """
+        SELECT p.product_name, d.calorie_category, d.sugar_category, d.sugar_to_carb_ratio
+        FROM derived_metrics d
+        JOIN product_info p ON d.product_code = p.product_code
+        ORDER BY d.sugar_to_carb_ratio DESC
+        LIMIT 5;
+    """
+}
+
+# Tab key -> query dict, in dashboard order
+QUERY_GROUPS = {
+    "product": PRODUCT_QUERIES,
+    "nutrient": NUTRIENT_QUERIES,
+    "derived": DERIVED_QUERIES,
+    "join": JOIN_QUERIES,
+}
+
+# -----------------------------
+# Engine
+# -----------------------------
+_engines = {}
+_lock = threading.Lock()
+
+def get_engine(db):
+    # One pooled engine per database URL for the whole process, so dashboard
+    # reruns and API requests reuse connections instead of opening new ones.
+    # A full `url` (e.g. the load test's SQLite stand-in) overrides the MySQL fields.
+    url = db.get("url") or f"mysql+pymysql://{db['db_user']}:{db['db_pass']}@{db['db_host']}/{db['db_name']}"
+    with _lock:
+        engine = _engines.get(url)
+        if engine is None:
+            engine = create_engine(url, pool_pre_ping=True, pool_recycle=3600)
+            _engines[url] = engine
+    return engine
+
+# -----------------------------
+# Data version + result cache
+# -----------------------------
+# Seconds between data-version probes; results are re-read only when it changes
+VERSION_TTL = 30
+# Upper bound on how long a result is served from cache, whatever the version says
+RESULT_MAX_AGE = 600
+
+# Dialect name -> probe; the SQLite one serves local stand-ins.
+# information_schema row counts/update times are cached by MySQL 8 (up to a day
+# by default) and only estimated by InnoDB, so MySQL uses live checksums instead.
+DATA_VERSION_SQL = {
+    "mysql": "CHECKSUM TABLE product_info, nutrient_info, derived_metrics;",
+    "sqlite": """
+        SELECT 'product_info', COUNT(*) FROM product_info
+        UNION ALL SELECT 'nutrient_info', COUNT(*) FROM nutrient_info
+        UNION ALL SELECT 'derived_metrics', COUNT(*) FROM derived_metrics;
+    """,
+}
+
+_versions = {}
+_results = {}
+
+def data_version(engine):
+    key = str(engine.url)
+    now = time.monotonic()
+    with _lock:
+        cached = _versions.get(key)
+    if cached is not None and now - cached[1] < VERSION_TTL:
+        return cached[0]
+
+    with engine.connect() as conn:
+        rows = conn.execute(text(DATA_VERSION_SQL[engine.dialect.name])).fetchall()
+    version = hashlib.sha1(repr([tuple(row) for row in rows]).encode()).hexdigest()[:16]
+
+    with _lock:
+        _versions[key] = (version, now)
+    return version
+
+def clear_cache():
+    # Forget all cached results and data versions (e.g. between load-test levels)
+    with _lock:
+        _results.clear()
+        _versions.clear()
+
+def run_query(query, engine, version=None):
+    # Callers that already probed (e.g. to build an ETag) pass that version in,
+    # so the result and its version cannot disagree
+    if version is None:
+        version = data_version(engine)
+    key = (str(engine.url), query)
+    with _lock:
+        cached = _results.get(key)
+    now = time.monotonic()
+    if cached is not None and cached[0] == version and now - cached[2] < RESULT_MAX_AGE:
+        # Hand out copies: the dashboard adds columns to some results
+        return cached[1].copy()
+
+    df = pd.read_sql(text(query), engine)
+    with _lock:
+        _results[key] = (version, df, now)
+    return df.copy()
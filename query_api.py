@@ -0,0 +1,207 @@
+# Headless access to the dashboard's named queries, as JSON or an Arrow stream.
+#
+#   python query_api.py list
+#   python query_api.py run nutrient 2 --format json
+#   python query_api.py serve --port 8502
+#
+# HTTP routes (serve):
+#   GET /queries                      -> {"product": [names...], ...}
+#   GET /queries/<group>/<query>      -> result rows (?format=json|arrow)
+#
+# <query> is either the full query name or its leading number ("2").
+# Responses carry an ETag tied to the data version, so pollers sending
+# If-None-Match get a 304 without the query being run.
+import argparse
+import hashlib
+import json
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+try:
+    import tomllib
+except ModuleNotFoundError:  # Python 3.10
+    import toml as tomllib
+
+from sqlalchemy.exc import SQLAlchemyError
+
+import queries
+
+SECRETS_PATH = ".streamlit/secrets.toml"
+ARROW_MIME = "application/vnd.apache.arrow.stream"
+
+# --- Config / engine ---
+def load_db_config(path=SECRETS_PATH):
+    # Same [database] section the Streamlit app reads through st.secrets
+    with open(path, encoding="utf-8") as f:
+        return tomllib.loads(f.read())["database"]
+
+# --- Query lookup ---
+def find_query(group, name):
+    group_queries = queries.QUERY_GROUPS.get(group)
+    if group_queries is None:
+        raise KeyError(f"Unknown query group '{group}'")
+    if name in group_queries:
+        return name, group_queries[name]
+    for full_name, sql in group_queries.items():
+        if full_name.split(".", 1)[0] == name:
+            return full_name, sql
+    raise KeyError(f"Unknown query '{name}' in group '{group}'")
+
+def list_queries():
+    return {group: list(group_queries) for group, group_queries in queries.QUERY_GROUPS.items()}
+
+# --- Serialisation ---
+def to_json(df, group, name, version):
+    payload = {
+        "group": group,
+        "query": name,
+        "data_version": version,
+        "columns": list(df.columns),
+        "rows": json.loads(df.to_json(orient="records", date_format="iso")),
+    }
+    return json.dumps(payload).encode()
+
+def to_arrow(df):
+    # pyarrow is optional; only the Arrow format needs it
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def make_etag(version, group, name, fmt):
+    digest = hashlib.sha1(f"{group}\0{name}\0{fmt}".encode()).hexdigest()[:8]
+    return f'"{version}-{digest}"'
+
+# --- HTTP service ---
+class QueryHandler(BaseHTTPRequestHandler):
+    engine = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [unquote(p) for p in url.path.strip("/").split("/") if p]
+
+        if parts == ["queries"]:
+            self._send(200, "application/json", json.dumps(list_queries()).encode())
+            return
+        if len(parts) != 3 or parts[0] != "queries":
+            self._error(404, "Use /queries or /queries/<group>/<query>")
+            return
+
+        try:
+            name, sql = find_query(parts[1], parts[2])
+        except KeyError as e:
+            self._error(404, e.args[0])
+            return
+
+        fmt = parse_qs(url.query).get("format", [None])[0]
+        if fmt is None:
+            fmt = "arrow" if ARROW_MIME in self.headers.get("Accept", "") else "json"
+        if fmt not in ("json", "arrow"):
+            self._error(400, f"Unsupported format '{fmt}' (use json or arrow)")
+            return
+
+        try:
+            # Cheap check first: the data version is probed at most every VERSION_TTL seconds.
+            # The same version then keys the cache lookup, the ETag and the payload.
+            version = queries.data_version(self.engine)
+            etag = make_etag(version, parts[1], name, fmt)
+            if etag in self.headers.get("If-None-Match", ""):
+                self._send(304, None, b"", etag)
+                return
+            df = queries.run_query(sql, self.engine, version)
+        except SQLAlchemyError as e:
+            self.log_error("Query '%s' failed: %s", name, e)
+            self._error(500, f"Database error: {e.__class__.__name__}")
+            return
+
+        if fmt == "arrow":
+            try:
+                body = to_arrow(df)
+            except ImportError:
+                self._error(501, "Arrow output requires pyarrow")
+                return
+            self._send(200, ARROW_MIME, body, etag)
+        else:
+            self._send(200, "application/json", to_json(df, parts[1], name, version), etag)
+
+    def _send(self, status, content_type, body, etag=None):
+        self.send_response(status)
+        if content_type:
+            self.send_header("Content-Type", content_type)
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, message):
+        self._send(status, "application/json", json.dumps({"error": message}).encode())
+
+def serve(engine, host, port):
+    QueryHandler.engine = engine
+    server = ThreadingHTTPServer((host, port), QueryHandler)
+    print(f"Serving ChocoCrunch queries on http://{host}:{port}/queries")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+# --- CLI ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless access to the ChocoCrunch dashboard queries")
+    parser.add_argument("--secrets", default=SECRETS_PATH, help="secrets.toml with a [database] section")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("list", help="List query groups and names")
+
+    run_p = sub.add_parser("run", help="Run one named query and print the result")
+    run_p.add_argument("group", choices=list(queries.QUERY_GROUPS))
+    run_p.add_argument("query", help="Full query name or its leading number")
+    run_p.add_argument("--format", choices=["json", "arrow"], default="json")
+    run_p.add_argument("-o", "--output", help="Write to a file instead of stdout")
+
+    serve_p = sub.add_parser("serve", help="Start the HTTP query service")
+    serve_p.add_argument("--host", default="127.0.0.1")
+    serve_p.add_argument("--port", type=int, default=8502)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        print(json.dumps(list_queries(), indent=2))
+        return 0
+
+    engine = queries.get_engine(load_db_config(args.secrets))
+
+    if args.command == "serve":
+        serve(engine, args.host, args.port)
+        return 0
+
+    try:
+        name, sql = find_query(args.group, args.query)
+    except KeyError as e:
+        parser.error(e.args[0])
+    version = queries.data_version(engine)
+    df = queries.run_query(sql, engine, version)
+    if args.format == "arrow":
+        body = to_arrow(df)
+    else:
+        body = to_json(df, args.group, name, version)
+
+    if args.output:
+        with open(args.output, "wb") as f:
+            f.write(body)
+    elif args.format == "arrow":
+        sys.stdout.buffer.write(body)
+    else:
+        print(body.decode())
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())